@@ -0,0 +1,215 @@
+# Command monitoring for the Motor client: per-collection/operation latency
+# histograms, a slow-operation log, and a one-off explain() of each slow find
+# shape to flag queries that scan the whole collection.
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+IGNORED_COMMANDS = {
+    'explain', 'hello', 'ismaster', 'isMaster', 'ping', 'buildInfo', 'saslStart',
+    'saslContinue', 'endSessions', 'killCursors',
+}
+MAX_TRACKED_CURSORS = 10_000
+# origin of getMores on change-stream cursors; they block ~1s on idle streams by design
+CHANGE_STREAM = object()
+
+
+def filter_shape(flt: Any) -> Any:
+    # keep keys and operators, drop values so logs carry no student data
+    if isinstance(flt, dict):
+        return {k: filter_shape(v) for k, v in flt.items()}
+    if isinstance(flt, (list, tuple)):
+        return [filter_shape(v) for v in flt[:1]]
+    return type(flt).__name__
+
+
+def _command_filter(name: str, cmd: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if name == 'find':
+        return cmd.get('filter', {})
+    if name == 'count':
+        return cmd.get('query', {})
+    if name in ('delete', 'update'):
+        ops = cmd.get('deletes' if name == 'delete' else 'updates') or [{}]
+        return ops[0].get('q', {})
+    if name == 'aggregate':
+        for stage in cmd.get('pipeline', []):
+            if '$match' in stage:
+                return stage['$match']
+        return {}
+    return None
+
+
+def _cursor_id(reply: Optional[Dict[str, Any]]) -> int:
+    cursor = reply.get('cursor') if reply is not None else None
+    return int(cursor.get('id', 0)) if isinstance(cursor, dict) else 0
+
+
+def _docs_returned(reply: Dict[str, Any]) -> int:
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    return int(reply.get('n', 0))
+
+
+def _has_collscan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        if plan.get('stage') == 'COLLSCAN':
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def observe(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f'<={b}ms' for b in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self, slow_ms: float = 100.0, slow_log_size: int = 100):
+        self.slow_ms = slow_ms
+        self.histograms: Dict[str, Histogram] = {}
+        self.slow_ops: deque = deque(maxlen=slow_log_size)
+        self.unindexed: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[Tuple[Any, int], Tuple[Optional[str], Any, int]] = {}
+        # (server, cursor id) -> filter of the find/aggregate that opened it, so
+        # slow getMores can be attributed to their query
+        self._cursors: Dict[Tuple[Any, int], Any] = {}
+        self._explained: set = set()
+        self._lock = threading.Lock()
+        self._db = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, db, loop: asyncio.AbstractEventLoop):
+        # enables explain() of slow finds; events arrive on driver threads
+        self._db = db
+        self._loop = loop
+
+    # ----- listener callbacks -----
+    def started(self, event):
+        name = event.command_name
+        cmd = event.command
+        if name == 'killCursors':
+            with self._lock:
+                for cursor_id in cmd.get('cursors', []):
+                    self._cursors.pop((event.connection_id, int(cursor_id)), None)
+        if name in IGNORED_COMMANDS:
+            return
+        key = (event.connection_id, event.request_id)
+        cursor_id = 0
+        if name == 'getMore':
+            coll = cmd.get('collection')
+            cursor_id = int(cmd['getMore'])
+            with self._lock:
+                flt = self._cursors.get((event.connection_id, cursor_id))
+            if flt is CHANGE_STREAM or (isinstance(coll, str) and coll.startswith('$cmd')):
+                return
+        else:
+            coll = cmd.get(name)
+            flt = _command_filter(name, cmd)
+            if name == 'aggregate' and any('$changeStream' in stage for stage in cmd.get('pipeline', [])[:1]):
+                flt = CHANGE_STREAM
+        with self._lock:
+            self._inflight[key] = (coll if isinstance(coll, str) else None, flt, cursor_id)
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event, None)
+
+    def _finish(self, event, reply: Optional[Dict[str, Any]]):
+        with self._lock:
+            info = self._inflight.pop((event.connection_id, event.request_id), None)
+        if info is None:
+            return
+        coll, flt, cursor_id = info
+        ms = event.duration_micros / 1000.0
+        op = event.command_name
+        name = f'{coll or "-"}.{op}'
+        self._track_cursor(event.connection_id, op, cursor_id, reply, flt)
+        if flt is CHANGE_STREAM:
+            return
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).observe(ms)
+        if ms < self.slow_ms:
+            return
+        docs = _docs_returned(reply) if reply is not None else 0
+        shape = filter_shape(flt) if flt is not None else None
+        entry = {'op': name, 'ms': round(ms, 3), 'filter': shape, 'docs': docs, 'failed': reply is None}
+        with self._lock:
+            self.slow_ops.append(entry)
+        logger.warning('Slow Mongo %s took %.1fms filter=%s docs=%d', name, ms, shape, docs)
+        if op == 'find' and coll:
+            self._schedule_explain(coll, flt or {}, shape)
+
+    def _track_cursor(self, server, op: str, cursor_id: int, reply: Optional[Dict[str, Any]], flt: Any):
+        # remember which query opened each cursor until it is exhausted or fails
+        next_id = _cursor_id(reply)
+        with self._lock:
+            if op == 'getMore':
+                if not next_id:
+                    self._cursors.pop((server, cursor_id), None)
+            elif next_id and op in ('find', 'aggregate'):
+                if len(self._cursors) >= MAX_TRACKED_CURSORS:
+                    self._cursors.pop(next(iter(self._cursors)))
+                self._cursors[(server, next_id)] = flt
+
+    # ----- index usage -----
+    def _schedule_explain(self, coll: str, flt: Dict[str, Any], shape: Any):
+        key = f'{coll} {shape}'
+        with self._lock:
+            if key in self._explained or self._db is None or self._loop is None:
+                return
+            self._explained.add(key)
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self._explain(key, coll, flt, shape)))
+
+    async def _explain(self, key: str, coll: str, flt: Dict[str, Any], shape: Any):
+        try:
+            plan = await self._db.command('explain', {'find': coll, 'filter': flt}, verbosity='queryPlanner')
+        except Exception as e:
+            logger.debug('explain failed for %s: %s', key, e)
+            return
+        if _has_collscan(plan.get('queryPlanner', {}).get('winningPlan')):
+            with self._lock:
+                self.unindexed[key] = {'collection': coll, 'filter': shape}
+            logger.warning('Mongo find on %s with filter=%s does not use an index (COLLSCAN)', coll, shape)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'slow_ms': self.slow_ms,
+                'commands': {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+                'slow_ops': list(self.slow_ops),
+                'unindexed': list(self.unindexed.values()),
+            }
@@ -0,0 +1,63 @@
+# Child-process half of run_in_sandbox_fallback: reads code on stdin, runs it
+# with restricted builtins and prints {"stdout", "stderr"} as JSON. Running in
+# its own process lets the backend kill it on timeout, deadline or disconnect.
+import json
+import sys
+import traceback
+from typing import Any, Dict, List
+
+MAX_MEMORY = 256 * 1024 * 1024
+MAX_CPU_SECONDS = 5
+MAX_OUTPUT = 100_000
+
+SAFE_BUILTINS = {
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'len': len,
+    'range': range,
+    'print': print,
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'list': list,
+    'dict': dict,
+    'set': set,
+    'tuple': tuple,
+}
+
+
+def _limit_resources():
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (MAX_MEMORY, MAX_MEMORY))
+    resource.setrlimit(resource.RLIMIT_CPU, (MAX_CPU_SECONDS, MAX_CPU_SECONDS))
+
+
+def run(code: str) -> Dict[str, str]:
+    stdout_capture: List[str] = []
+
+    def safe_print(*args, **kwargs):
+        msg = " ".join(str(a) for a in args)
+        stdout_capture.append(msg)
+
+    safe_globals = {
+        "__builtins__": SAFE_BUILTINS | {"print": safe_print},
+    }
+    safe_locals: Dict[str, Any] = {}
+    try:
+        exec(code, safe_globals, safe_locals)
+        stderr = ""
+    except Exception:
+        stderr = traceback.format_exc()[:2000]
+    return {"stdout": "\n".join(stdout_capture)[:MAX_OUTPUT], "stderr": stderr}
+
+
+if __name__ == "__main__":
+    _limit_resources()
+    result = run(sys.stdin.read())
+    sys.stdout.write(json.dumps(result))
@@ -0,0 +1,590 @@
+# Step-budgeted interpreter for the beginner Python subset used by LEVELS:
+# variables, arithmetic, strings, if/else, loops, functions, lists and dicts.
+# Programs run on the event loop, yield every YIELD_EVERY steps and are
+# stopped once they exceed their step or allocation budget. Code outside the
+# subset raises Unsupported before anything runs so callers can fall back to
+# the exec / container executors.
+import ast
+import asyncio
+import operator
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_STEPS = int(os.environ.get('INTERP_MAX_STEPS', '200000'))
+MAX_ALLOC = int(os.environ.get('INTERP_MAX_ALLOC', '1000000'))  # elements/chars allocated over the run
+MAX_CALL_DEPTH = 50  # deeper recursion falls back to a real interpreter
+MAX_INT_BITS = 100_000
+YIELD_EVERY = 1000
+
+
+class Unsupported(Exception):
+    pass
+
+
+class StepLimitExceeded(Exception):
+    pass
+
+
+class AllocationLimitExceeded(Exception):
+    pass
+
+
+# ---------- Subset definition ----------
+ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.If, ast.For, ast.While,
+    ast.Break, ast.Continue, ast.Pass, ast.FunctionDef, ast.Return, ast.arguments, ast.arg,
+    ast.Constant, ast.Name, ast.Load, ast.Store, ast.BinOp, ast.UnaryOp, ast.BoolOp,
+    ast.Compare, ast.Call, ast.keyword, ast.Attribute, ast.List, ast.Tuple, ast.Dict,
+    ast.Subscript, ast.Slice, ast.IfExp, ast.JoinedStr, ast.FormattedValue,
+    ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+)
+
+STR_METHODS = {
+    'upper', 'lower', 'title', 'capitalize', 'strip', 'lstrip', 'rstrip', 'split',
+    'join', 'replace', 'startswith', 'endswith', 'find', 'count', 'index',
+    'isdigit', 'isalpha', 'isupper', 'islower',
+}
+LIST_METHODS = {'append', 'pop', 'insert', 'remove', 'index', 'count', 'sort', 'reverse', 'extend', 'copy', 'clear'}
+DICT_METHODS = {'get', 'keys', 'values', 'items', 'pop', 'update', 'copy', 'clear'}
+METHODS = {str: STR_METHODS, list: LIST_METHODS, dict: DICT_METHODS}
+ALL_METHODS = STR_METHODS | LIST_METHODS | DICT_METHODS
+
+BUILTINS: Dict[str, Any] = {
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'len': len,
+    'range': range,
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'list': list,
+    'dict': dict,
+    'set': set,
+    'tuple': tuple,
+    'sorted': sorted,
+    'round': round,
+    'enumerate': enumerate,
+    'zip': zip,
+    'reversed': reversed,
+}
+# builtins that walk their whole argument; iterables are materialized under budget first
+CONSUMING_BUILTINS = {min, max, sum, list, dict, set, tuple, sorted}
+
+
+def check_subset(tree: ast.AST):
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise Unsupported(type(node).__name__)
+        if isinstance(node, ast.FunctionDef):
+            a = node.args
+            if node.decorator_list or a.vararg or a.kwarg or a.kwonlyargs or a.posonlyargs:
+                raise Unsupported('function signature')
+        elif isinstance(node, ast.Attribute):
+            if node.attr not in ALL_METHODS:
+                raise Unsupported(f'attribute {node.attr}')
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                pass
+            elif not isinstance(node.func, ast.Name):
+                raise Unsupported('call target')
+            if node.keywords:
+                is_print = isinstance(node.func, ast.Name) and node.func.id == 'print'
+                if not is_print or any(k.arg not in ('sep', 'end') for k in node.keywords):
+                    raise Unsupported('keyword arguments')
+        elif isinstance(node, ast.Subscript):
+            if isinstance(node.ctx, ast.Store) and isinstance(node.slice, ast.Slice):
+                raise Unsupported('slice assignment')
+    # names must be defined by the program or be one of our builtins; anything
+    # else (type, isinstance, input, ...) needs a real Python
+    defined = set(BUILTINS) | {'print'}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            defined.add(node.id)
+        elif isinstance(node, ast.FunctionDef):
+            defined.add(node.name)
+        elif isinstance(node, ast.arg):
+            defined.add(node.arg)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in defined:
+            raise Unsupported(f'name {node.id}')
+    # attributes are only reachable as method calls
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            node.func._is_method = True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and not getattr(node, '_is_method', False):
+            raise Unsupported('attribute access')
+
+
+def _assigned_names(body: List[ast.stmt]) -> set:
+    names = set()
+    stack: List[ast.AST] = list(body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.FunctionDef):
+            names.add(node.name)
+            continue
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        stack.extend(ast.iter_child_nodes(node))
+    return names
+
+
+# ---------- Runtime ----------
+class Scope:
+    def __init__(self, parent: Optional['Scope'] = None, local_names: Optional[set] = None):
+        self.vars: Dict[str, Any] = {}
+        self.parent = parent
+        self.local_names = local_names  # None for the module scope
+
+
+class UserFunction:
+    def __init__(self, node: ast.FunctionDef, defaults: List[Any], closure: Scope):
+        self.node = node
+        self.name = node.name
+        self.params = [a.arg for a in node.args.args]
+        self.defaults = defaults
+        self.closure = closure
+        self.local_names = _assigned_names(node.body) | set(self.params)
+
+    def __repr__(self):
+        return f'<function {self.name}>'
+
+
+class _Return:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+BREAK = object()
+CONTINUE = object()
+
+_BINOPS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Mod: lambda a, b: a % b,
+    ast.Pow: lambda a, b: a ** b,
+    ast.LShift: lambda a, b: a << b,
+    ast.RShift: lambda a, b: a >> b,
+    ast.BitAnd: lambda a, b: a & b,
+    ast.BitOr: lambda a, b: a | b,
+    ast.BitXor: lambda a, b: a ^ b,
+}
+_INPLACE_BINOPS = {
+    ast.Add: operator.iadd,
+    ast.Sub: operator.isub,
+    ast.Mult: operator.imul,
+    ast.Div: operator.itruediv,
+    ast.FloorDiv: operator.ifloordiv,
+    ast.Mod: operator.imod,
+    ast.Pow: operator.ipow,
+    ast.LShift: operator.ilshift,
+    ast.RShift: operator.irshift,
+    ast.BitAnd: operator.iand,
+    ast.BitOr: operator.ior,
+    ast.BitXor: operator.ixor,
+}
+_UNARYOPS = {
+    ast.UAdd: lambda a: +a,
+    ast.USub: lambda a: -a,
+    ast.Not: lambda a: not a,
+    ast.Invert: lambda a: ~a,
+}
+_CMPOPS = {
+    ast.Eq: lambda a, b: a == b,
+    ast.NotEq: lambda a, b: a != b,
+    ast.Lt: lambda a, b: a < b,
+    ast.LtE: lambda a, b: a <= b,
+    ast.Gt: lambda a, b: a > b,
+    ast.GtE: lambda a, b: a >= b,
+    ast.Is: lambda a, b: a is b,
+    ast.IsNot: lambda a, b: a is not b,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+_FORMAT_WIDTH = re.compile(r'\d{4,}')
+
+
+def _size(value: Any) -> int:
+    if isinstance(value, (str, list, tuple, dict, set)):
+        return len(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value.bit_length() // 64
+    return 1
+
+
+def _int_bits(value: Any) -> int:
+    return max(1, abs(value).bit_length()) if isinstance(value, int) else 64
+
+
+class Interpreter:
+    def __init__(self, max_steps: int = MAX_STEPS, max_alloc: int = MAX_ALLOC):
+        self.max_steps = max_steps
+        self.max_alloc = max_alloc
+        self.steps = 0
+        self.alloc = 0
+        self.depth = 0
+        self.lineno = 0
+        self.out: List[str] = []
+
+    # ----- budgets -----
+    async def step(self, n: int = 1):
+        before = self.steps
+        self.steps += n
+        if self.steps > self.max_steps:
+            raise StepLimitExceeded(f'program ran for more than {self.max_steps} steps')
+        if self.steps // YIELD_EVERY != before // YIELD_EVERY:
+            await asyncio.sleep(0)
+
+    def charge(self, n: int):
+        self.alloc += n
+        if self.alloc > self.max_alloc:
+            raise AllocationLimitExceeded(f'program allocated more than {self.max_alloc} items')
+
+    async def materialize(self, iterable: Any) -> Any:
+        if isinstance(iterable, (str, list, tuple, dict, set)):
+            await self.step(len(iterable))
+            return iterable
+        items = []
+        for item in iterable:
+            await self.step()
+            self.charge(1)
+            items.append(item)
+        return items
+
+    # ----- statements -----
+    async def run(self, tree: ast.Module):
+        scope = Scope()
+        await self.exec_block(tree.body, scope)
+
+    async def exec_block(self, body: List[ast.stmt], scope: Scope):
+        for stmt in body:
+            signal = await self.exec_stmt(stmt, scope)
+            if signal is not None:
+                return signal
+        return None
+
+    async def exec_stmt(self, node: ast.stmt, scope: Scope):
+        self.lineno = node.lineno
+        await self.step()
+        if isinstance(node, ast.Expr):
+            await self.eval(node.value, scope)
+        elif isinstance(node, ast.Assign):
+            value = await self.eval(node.value, scope)
+            for target in node.targets:
+                await self.assign(target, value, scope)
+        elif isinstance(node, ast.AugAssign):
+            await self.aug_assign(node, scope)
+        elif isinstance(node, ast.If):
+            branch = node.body if await self.eval(node.test, scope) else node.orelse
+            return await self.exec_block(branch, scope)
+        elif isinstance(node, ast.While):
+            while await self.eval(node.test, scope):
+                signal = await self.exec_block(node.body, scope)
+                if signal is BREAK:
+                    break
+                if isinstance(signal, _Return):
+                    return signal
+            else:
+                return await self.exec_block(node.orelse, scope)
+        elif isinstance(node, ast.For):
+            iterable = await self.eval(node.iter, scope)
+            for item in iterable:
+                await self.assign(node.target, item, scope)
+                signal = await self.exec_block(node.body, scope)
+                if signal is BREAK:
+                    break
+                if isinstance(signal, _Return):
+                    return signal
+            else:
+                return await self.exec_block(node.orelse, scope)
+        elif isinstance(node, ast.FunctionDef):
+            defaults = [await self.eval(d, scope) for d in node.args.defaults]
+            scope.vars[node.name] = UserFunction(node, defaults, scope)
+        elif isinstance(node, ast.Return):
+            value = await self.eval(node.value, scope) if node.value is not None else None
+            return _Return(value)
+        elif isinstance(node, ast.Break):
+            return BREAK
+        elif isinstance(node, ast.Continue):
+            return CONTINUE
+        return None
+
+    async def assign(self, target: ast.expr, value: Any, scope: Scope):
+        if isinstance(target, ast.Name):
+            scope.vars[target.id] = value
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            values = await self.materialize(value)
+            values = list(values)
+            if len(values) != len(target.elts):
+                raise ValueError(f'expected {len(target.elts)} values to unpack, got {len(values)}')
+            for elt, v in zip(target.elts, values):
+                await self.assign(elt, v, scope)
+        elif isinstance(target, ast.Subscript):
+            container = await self.eval(target.value, scope)
+            key = await self.eval(target.slice, scope)
+            if isinstance(container, dict) and key not in container:
+                self.charge(1)
+            container[key] = value
+        else:
+            raise Unsupported(type(target).__name__)
+
+    async def aug_assign(self, node: ast.AugAssign, scope: Scope):
+        # container and key are evaluated once; lists and dicts change in place
+        target = node.target
+        if isinstance(target, ast.Name):
+            current = self.lookup(target.id, scope)
+            scope.vars[target.id] = await self.binop(node.op, current, await self.eval(node.value, scope), inplace=True)
+        elif isinstance(target, ast.Subscript):
+            container = await self.eval(target.value, scope)
+            key = await self.eval(target.slice, scope)
+            current = container[key]
+            container[key] = await self.binop(node.op, current, await self.eval(node.value, scope), inplace=True)
+        else:
+            raise Unsupported(type(target).__name__)
+
+    # ----- expressions -----
+    async def eval(self, node: ast.expr, scope: Scope) -> Any:
+        await self.step()
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return self.lookup(node.id, scope)
+        if isinstance(node, ast.BinOp):
+            return await self.binop(node.op, await self.eval(node.left, scope), await self.eval(node.right, scope))
+        if isinstance(node, ast.UnaryOp):
+            return _UNARYOPS[type(node.op)](await self.eval(node.operand, scope))
+        if isinstance(node, ast.BoolOp):
+            is_and = isinstance(node.op, ast.And)
+            value = None
+            for expr in node.values:
+                value = await self.eval(expr, scope)
+                if bool(value) != is_and:
+                    return value
+            return value
+        if isinstance(node, ast.Compare):
+            left = await self.eval(node.left, scope)
+            for op, expr in zip(node.ops, node.comparators):
+                right = await self.eval(expr, scope)
+                if isinstance(right, (str, list, tuple, dict, set)):
+                    await self.step(len(right))
+                if not _CMPOPS[type(op)](left, right):
+                    return False
+                left = right
+            return True
+        if isinstance(node, ast.IfExp):
+            return await self.eval(node.body if await self.eval(node.test, scope) else node.orelse, scope)
+        if isinstance(node, ast.Call):
+            return await self.call(node, scope)
+        if isinstance(node, (ast.List, ast.Tuple)):
+            values = [await self.eval(e, scope) for e in node.elts]
+            self.charge(len(values))
+            return values if isinstance(node, ast.List) else tuple(values)
+        if isinstance(node, ast.Dict):
+            result = {}
+            for k, v in zip(node.keys, node.values):
+                result[await self.eval(k, scope)] = await self.eval(v, scope)
+            self.charge(len(result))
+            return result
+        if isinstance(node, ast.Subscript):
+            container = await self.eval(node.value, scope)
+            key = await self.eval(node.slice, scope)
+            result = container[key]
+            if isinstance(key, slice):
+                self.charge(_size(result))
+            return result
+        if isinstance(node, ast.Slice):
+            lower = await self.eval(node.lower, scope) if node.lower else None
+            upper = await self.eval(node.upper, scope) if node.upper else None
+            step = await self.eval(node.step, scope) if node.step else None
+            return slice(lower, upper, step)
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for value in node.values:
+                if isinstance(value, ast.Constant):
+                    parts.append(value.value)
+                else:
+                    parts.append(await self.format_value(value, scope))
+            result = ''.join(parts)
+            self.charge(len(result))
+            return result
+        raise Unsupported(type(node).__name__)
+
+    async def format_value(self, node: ast.FormattedValue, scope: Scope) -> str:
+        value = await self.eval(node.value, scope)
+        if node.conversion == ord('r'):
+            value = repr(value)
+        elif node.conversion == ord('s'):
+            value = str(value)
+        elif node.conversion == ord('a'):
+            value = ascii(value)
+        spec = ''
+        if node.format_spec is not None:
+            spec = await self.eval(node.format_spec, scope)
+            if _FORMAT_WIDTH.search(spec):
+                raise ValueError('format width too large')
+        return format(value, spec)
+
+    def lookup(self, name: str, scope: Scope) -> Any:
+        s: Optional[Scope] = scope
+        innermost = True
+        while s is not None:
+            if name in s.vars:
+                return s.vars[name]
+            if s.local_names is not None and name in s.local_names:
+                if innermost:
+                    raise UnboundLocalError(f"local variable '{name}' referenced before assignment")
+                raise NameError(f"free variable '{name}' referenced before assignment")
+            innermost = False
+            s = s.parent
+        if name == 'print':
+            return self.print
+        if name in BUILTINS:
+            return BUILTINS[name]
+        raise NameError(f"name '{name}' is not defined")
+
+    async def binop(self, op: ast.operator, left: Any, right: Any, inplace: bool = False) -> Any:
+        kind = type(op)
+        if inplace and kind is ast.Add and isinstance(left, list):
+            # list += iterable extends in place; only the new items are allocated
+            right = await self.materialize(right)
+            self.charge(_size(right))
+            return operator.iadd(left, right)
+        if kind is ast.Mult and isinstance(left, int) and isinstance(right, int):
+            if _int_bits(left) + _int_bits(right) > MAX_INT_BITS:
+                raise AllocationLimitExceeded('number too large')
+        elif kind is ast.Mult:
+            for seq, n in ((left, right), (right, left)):
+                if isinstance(seq, (str, list, tuple)) and isinstance(n, int):
+                    self.charge(len(seq) * max(0, n))
+                    await self.step(max(0, n))
+        elif kind is ast.Pow and isinstance(left, int) and isinstance(right, int) and right > 0:
+            if _int_bits(left) * right > MAX_INT_BITS and abs(left) > 1:
+                raise AllocationLimitExceeded('number too large')
+        elif kind is ast.LShift and isinstance(right, int) and _int_bits(left) + right > MAX_INT_BITS:
+            raise AllocationLimitExceeded('number too large')
+        elif kind is ast.Mod and isinstance(left, str):
+            raise Unsupported("'%' string formatting")
+        result = (_INPLACE_BINOPS if inplace else _BINOPS)[kind](left, right)
+        if kind in (ast.Add, ast.Mult, ast.Pow, ast.LShift):
+            self.charge(_size(result))
+        return result
+
+    async def call(self, node: ast.Call, scope: Scope) -> Any:
+        if isinstance(node.func, ast.Attribute):
+            obj = await self.eval(node.func.value, scope)
+            args = [await self.eval(a, scope) for a in node.args]
+            return await self.call_method(obj, node.func.attr, args)
+        func = await self.eval(node.func, scope)
+        args = [await self.eval(a, scope) for a in node.args]
+        if func == self.print:
+            kwargs = {k.arg: await self.eval(k.value, scope) for k in node.keywords}
+            return self.print(*args, **kwargs)
+        if node.keywords:
+            raise TypeError(f'{getattr(func, "__name__", func)}() takes no keyword arguments')
+        if isinstance(func, UserFunction):
+            return await self.call_function(func, args)
+        if not any(func is b for b in BUILTINS.values()):
+            raise TypeError(f"'{type(func).__name__}' object is not callable")
+        if func in CONSUMING_BUILTINS:
+            args = [await self.materialize(a) if not isinstance(a, (int, float)) else a for a in args]
+        if func is range:
+            result = range(*args)
+        else:
+            result = func(*args)
+        if isinstance(result, (str, list, tuple, dict, set)):
+            self.charge(len(result))
+        elif func is int or func is str:
+            self.charge(_size(result))
+        return result
+
+    async def call_function(self, func: UserFunction, args: List[Any]) -> Any:
+        params = func.params
+        missing = len(params) - len(args)
+        if len(args) > len(params) or missing > len(func.defaults):
+            raise TypeError(f'{func.name}() takes {len(params)} arguments but {len(args)} were given')
+        if missing:
+            args = args + func.defaults[len(func.defaults) - missing:]
+        if self.depth >= MAX_CALL_DEPTH:
+            raise Unsupported('deep recursion')
+        local = Scope(parent=func.closure, local_names=func.local_names)
+        local.vars.update(zip(params, args))
+        self.depth += 1
+        try:
+            signal = await self.exec_block(func.node.body, local)
+        finally:
+            self.depth -= 1
+        return signal.value if isinstance(signal, _Return) else None
+
+    async def call_method(self, obj: Any, name: str, args: List[Any]) -> Any:
+        allowed = METHODS.get(type(obj))
+        if allowed is None:
+            # sets, tuples, ranges, ... have methods of the same names we don't model
+            raise Unsupported(f'{type(obj).__name__}.{name}')
+        if name not in allowed:
+            raise AttributeError(f"'{type(obj).__name__}' object has no attribute '{name}'")
+        if isinstance(obj, (list, str)) and name in ('index', 'count', 'remove', 'find', 'sort'):
+            await self.step(len(obj))
+        if name in ('join', 'extend', 'update'):
+            args = [await self.materialize(a) for a in args]
+            if name == 'join' and args:
+                self.charge(sum(len(x) for x in args[0] if isinstance(x, str)) + len(obj) * len(args[0]))
+            else:
+                self.charge(sum(_size(a) for a in args))
+        elif name == 'replace' and len(args) >= 2 and isinstance(args[0], str) and isinstance(args[1], str):
+            self.charge(len(obj) + (obj.count(args[0]) + 1) * max(0, len(args[1]) - len(args[0])))
+        elif name in ('append', 'insert'):
+            self.charge(1)
+        result = getattr(obj, name)(*args)
+        if isinstance(result, (str, list)) and name not in ('join', 'replace'):
+            self.charge(len(result))
+        return result
+
+    def print(self, *args, sep=' ', end='\n'):
+        sep = ' ' if sep is None else sep
+        end = '\n' if end is None else end
+        if not isinstance(sep, str) or not isinstance(end, str):
+            raise TypeError('sep and end must be strings')
+        text = sep.join(str(a) for a in args) + end
+        self.charge(len(text))
+        self.out.append(text)
+
+    def stdout(self) -> str:
+        text = ''.join(self.out)
+        return text[:-1] if text.endswith('\n') else text
+
+
+def parse(code: str) -> ast.Module:
+    # raises SyntaxError for invalid code, Unsupported for code outside the subset
+    tree = ast.parse(code, '<main>')
+    compile(tree, '<main>', 'exec')  # surfaces 'return outside function' etc. without running
+    check_subset(tree)
+    return tree
+
+
+async def run_restricted(code: str, max_steps: int = MAX_STEPS, max_alloc: int = MAX_ALLOC) -> Tuple[str, str]:
+    try:
+        tree = parse(code)
+    except SyntaxError as e:
+        return "", f'  File "<main>", line {e.lineno or 1}\nSyntaxError: {e.msg}'
+    except (RecursionError, MemoryError, ValueError) as e:
+        # e.g. expressions nested too deeply to compile, or null bytes in the source
+        return "", f'  File "<main>", line 1\n{type(e).__name__}: {e}'
+    interp = Interpreter(max_steps=max_steps, max_alloc=max_alloc)
+    try:
+        await interp.run(tree)
+    except Unsupported:
+        raise
+    except Exception as e:
+        tb = f'Traceback (most recent call last):\n  File "<main>", line {interp.lineno}\n{type(e).__name__}: {e}'
+        return interp.stdout(), tb[:2000]
+    return interp.stdout(), ""
@@ -1,15 +1,27 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Tuple
 from datetime import datetime
+from collections import OrderedDict
 import uuid
 import os
 import re
 import asyncio
-import traceback
+import sys
+import logging
+import codecs
+import csv
+import io
+import json
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
 from dotenv import load_dotenv
+from interpreter import run_restricted, Unsupported
+from db_metrics import CommandMetrics
+
+logger = logging.getLogger(__name__)
 
 # Load env
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
@@ -19,7 +31,8 @@ MONGO_URL = os.environ.get('MONGO_URL')
 DB_NAME = os.environ.get('DB_NAME')
 if not MONGO_URL or not DB_NAME:
     raise RuntimeError('Missing MONGO_URL or DB_NAME env')
-client = AsyncIOMotorClient(MONGO_URL)
+command_metrics = CommandMetrics(slow_ms=float(os.environ.get('MONGO_SLOW_MS', '100')))
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[command_metrics])
 db = client[DB_NAME]
 
 # FastAPI app and prefixed router
@@ -39,6 +52,7 @@ app.add_middleware(
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
+    external_id: Optional[str] = None  # school roster id, unique when set
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Progress(BaseModel):
@@ -200,54 +214,254 @@ BLOCKED_PATTERNS = [
     r"exec\(",
 ]
 
-SAFE_BUILTINS = {
-    'abs': abs,
-    'min': min,
-    'max': max,
-    'sum': sum,
-    'len': len,
-    'range': range,
-    'print': print,
-    'str': str,
-    'int': int,
-    'float': float,
-    'bool': bool,
-    'list': list,
-    'dict': dict,
-    'set': set,
-    'tuple': tuple,
-}
-
-async def run_in_sandbox_fallback(code: str) -> Dict[str, str]:
-    # In-process ultra-limited exec with timeout, no fs, no net, restricted builtins
+FALLBACK_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fallback_runner.py')
+FALLBACK_TIMEOUT = 3
+
+async def run_in_sandbox_fallback(code: str) -> Tuple[str, str]:
+    # Ultra-limited exec in a child process (see fallback_runner.py): restricted
+    # builtins, rlimits, 3s timeout. The process is killed on timeout or when the
+    # caller is cancelled, e.g. on client disconnect or a passed deadline.
     for pat in BLOCKED_PATTERNS:
         if re.search(pat, code):
-            return {"stdout": "", "stderr": "Blocked code detected"}
-
-    loop = asyncio.get_event_loop()
-    stdout_capture: List[str] = []
-
-    def safe_print(*args, **kwargs):
-        msg = " ".join(str(a) for a in args)
-        stdout_capture.append(msg)
-
-    safe_globals = {
-        "__builtins__": SAFE_BUILTINS | {"print": safe_print},
-    }
-    safe_locals: Dict[str, Any] = {}
-
-    async def _run():
+            return "", "Blocked code detected"
+
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, '-I', FALLBACK_RUNNER,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(code.encode()), timeout=FALLBACK_TIMEOUT)
+    except asyncio.TimeoutError:
+        return "", "Timed out"
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+        # drain the pipes too: the transport only closes once they hit EOF
+        await asyncio.shield(proc.communicate())
+    try:
+        data = json.loads(out)
+    except ValueError:
+        # killed by an rlimit (memory/CPU) or crashed before reporting
+        return "", (err.decode(errors="ignore").strip() or "Program stopped: used too much memory or time")[-2000:]
+    return data.get("stdout", ""), data.get("stderr", "")
+
+# ---------- Progress cache ----------
+# Read-through LRU of per-user progress payloads so repeat UI fetches skip Mongo.
+# Writes in execute_code update the cached entry in place.
+PROGRESS_CACHE_SIZE = int(os.environ.get('PROGRESS_CACHE_SIZE', '1024'))
+PROGRESS_ITEMS_LIMIT = 1000
+
+class ProgressCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # reads that raced a write for the same user must not be cached: while a
+        # fill is in flight its user maps to [fills in flight, writes seen], and a
+        # generation bumped by full invalidations fences every fill at once
+        self._generation = 0
+        self._fills: Dict[str, List[int]] = {}
+
+    def begin_fill(self, user_id: str):
+        fill = self._fills.setdefault(user_id, [0, 0])
+        fill[0] += 1
+        return (self._generation, fill[1])
+
+    def end_fill(self, user_id: str):
+        fill = self._fills.get(user_id)
+        if fill is not None:
+            fill[0] -= 1
+            if fill[0] <= 0:
+                del self._fills[user_id]
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(user_id)
+        return {
+            "items": list(entry["items"]),
+            "total_points": entry["total_points"],
+            "passed_levels": list(entry["passed_levels"]),
+        }
+
+    def put(self, user_id: str, payload: Dict[str, Any], version):
+        fill = self._fills.get(user_id)
+        if self.maxsize <= 0 or fill is None or version != (self._generation, fill[1]):
+            return
+        self._entries[user_id] = {
+            "items": list(payload["items"]),
+            "total_points": payload["total_points"],
+            "passed_levels": list(payload["passed_levels"]),
+        }
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _written(self, user_id: str):
+        fill = self._fills.get(user_id)
+        if fill is not None:
+            fill[1] += 1
+
+    def record(self, user_id: str, item: Dict[str, Any]):
+        self._written(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if any(it.get("id") == item.get("id") for it in entry["items"]):
+            # already applied, e.g. our own write echoed back by the change stream
+            return
+        if len(entry["items"]) >= PROGRESS_ITEMS_LIMIT:
+            # the uncached query caps items; let the next read rebuild it
+            self.invalidate(user_id)
+            return
+        entry["items"].append(item)
+        entry["total_points"] += item.get("points_earned", 0)
+        if item.get("passed") and item.get("level_id") not in entry["passed_levels"]:
+            entry["passed_levels"].append(item.get("level_id"))
+
+    def invalidate(self, user_id: Optional[str] = None):
+        if user_id is None:
+            self._generation += 1
+            self._entries.clear()
+        else:
+            self._written(user_id)
+            self._entries.pop(user_id, None)
+
+progress_cache = ProgressCache(PROGRESS_CACHE_SIZE)
+
+# ---------- Cross-worker cache coherence ----------
+# Every worker tails a Mongo change stream and applies writes made by other
+# workers/nodes to its local caches. Change streams need a replica set; on a
+# standalone server the caches are turned off, since no worker would hear
+# about writes made by the others.
+CHANGE_HANDLERS: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+CHANGE_STREAM_UNSUPPORTED = 40573
+RESUME_TOKEN_LOST = (260, 280, 286)  # InvalidResumeToken, ChangeStreamFatalError, ChangeStreamHistoryLost
+
+def on_change(collection: str):
+    def register(fn):
+        CHANGE_HANDLERS.setdefault(collection, []).append(fn)
+        return fn
+    return register
+
+def invalidate_all_caches():
+    progress_cache.invalidate()
+
+def disable_all_caches():
+    progress_cache.maxsize = 0
+    progress_cache.invalidate()
+
+@on_change("progress")
+def _progress_changed(change: Dict[str, Any]):
+    doc = dict(change.get("fullDocument") or {})
+    doc.pop("_id", None)
+    if change.get("operationType") == "insert" and doc.get("user_id"):
+        progress_cache.record(doc["user_id"], doc)
+    else:
+        # updates/deletes only carry the Mongo _id, so we can't tell whose entry changed
+        progress_cache.invalidate()
+
+async def watch_changes():
+    pipeline = [{"$match": {"ns.coll": {"$in": list(CHANGE_HANDLERS)}}}]
+    token = None
+    delay = 1
+    while True:
         try:
-            exec(code, safe_globals, safe_locals)
-            return "\n".join(stdout_capture), ""
-        except Exception:
-            tb = traceback.format_exc()
-            return "\n".join(stdout_capture), tb[:2000]
+            async with db.watch(pipeline, resume_after=token) as stream:
+                delay = 1
+                async for change in stream:
+                    token = stream.resume_token
+                    for handler in CHANGE_HANDLERS.get(change.get("ns", {}).get("coll"), []):
+                        try:
+                            handler(change)
+                        except Exception:
+                            # a change we failed to apply leaves the cache unknown
+                            logger.exception("Change handler %s failed", handler.__name__)
+                            invalidate_all_caches()
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_UNSUPPORTED:
+                logger.warning("Change streams unsupported by MongoDB server (not a replica set); progress cache disabled")
+                disable_all_caches()
+                return
+            if e.code in RESUME_TOKEN_LOST:
+                token = None
+            logger.warning("Change stream failed: %s", e)
+        except PyMongoError as e:
+            logger.warning("Change stream disconnected: %s", e)
+        # anything written while we were away is unknown, so start cold
+        invalidate_all_caches()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30)
+
+# ---------- Deadlines ----------
+# Callers send their remaining budget in X-Deadline-Ms; it is capped at
+# RUN_BUDGET_MS and forwarded to the sandbox service so it never works past it.
+DEADLINE_HEADER = "X-Deadline-Ms"
+RUN_BUDGET_MS = int(os.environ.get('RUN_BUDGET_MS', '10000'))
+DISCONNECT_POLL = 0.1
+
+class ClientDisconnected(Exception):
+    pass
+
+def request_budget(request: Request) -> float:
+    try:
+        ms = int(request.headers.get(DEADLINE_HEADER, RUN_BUDGET_MS))
+    except ValueError:
+        ms = RUN_BUDGET_MS
+    return max(0, min(ms, RUN_BUDGET_MS)) / 1000
+
+async def cancel_on_disconnect(request: Request, coro, timeout: Optional[float] = None):
+    # run coro until it finishes; cancel it if the client disconnects or time runs out
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(coro)
+    deadline = loop.time() + (timeout if timeout is not None else request_budget(request))
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            done, _ = await asyncio.wait({task}, timeout=min(DISCONNECT_POLL, remaining))
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            # wait for the cancelled run to clean up (kill its process) before answering
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+async def run_code(code: str, budget: float):
+    # beginner-subset programs run in the step-budgeted interpreter;
+    # anything else falls back to the sandbox service or in-process exec
+    deadline = asyncio.get_running_loop().time() + budget
+    try:
+        return await run_restricted(code)
+    except Unsupported:
+        pass
 
+    sandbox_url = os.environ.get('SANDBOX_URL')
+    if not sandbox_url:
+        return await run_in_sandbox_fallback(code)
+
+    # Call external sandbox service via HTTP; cancelling this closes the
+    # connection, which makes the sandbox kill its container
     try:
-        return await asyncio.wait_for(_run(), timeout=3)
+        import aiohttp
+        remaining = max(0.0, deadline - asyncio.get_running_loop().time())
+        headers = {DEADLINE_HEADER: str(int(remaining * 1000))}
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=remaining)) as session:
+            async with session.post(sandbox_url + '/run', json={"code": code}, headers=headers) as resp:
+                data = await resp.json()
+                return data.get('stdout', ''), data.get('stderr', '')
     except asyncio.TimeoutError:
         return "", "Timed out"
+    except Exception as e:
+        return "", f"Sandbox error: {e}"
 
 # ---------- Validators ----------
 def validate_output(level: Level, stdout: str, stderr: str) -> Dict[str, Any]:
@@ -289,19 +503,146 @@ async def create_user(payload: CreateUser):
     await db.users.insert_one(user.model_dump())
     return user
 
+# -------- Bulk roster provisioning --------
+# Accepts text/csv (header row with a "name" column and optional
+# "external_id"), application/x-ndjson, or an application/json array.
+# Rows are inserted with unordered insert_many batches; rows whose
+# external_id already exists are reported with the existing user id.
+# Every result line carries the 1-based roster row it belongs to.
+# JSON and NDJSON must be UTF-8; CSV that isn't UTF-8 is read as cp1252,
+# the encoding of Excel's "CSV" export on Windows.
+ROSTER_BATCH_SIZE = 1000
+DUPLICATE_KEY = 11000
+CSV_FALLBACK_ENCODING = "cp1252"
+
+async def _stream_lines(request: Request):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    try:
+        async for chunk in request.stream():
+            buf += decoder.decode(chunk)
+            *lines, buf = buf.split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+        buf += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Roster must be UTF-8 encoded")
+    if buf:
+        yield buf.rstrip("\r")
+
+def _decode_csv(body: bytes) -> str:
+    try:
+        return body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return body.decode(CSV_FALLBACK_ENCODING, errors="replace")
+
+async def _roster_rows(request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "application/json":
+        body = await request.body()
+        try:
+            rows = json.loads(body or b"[]")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON roster")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="JSON roster must be an array")
+        for row in rows:
+            yield row
+    elif content_type == "application/x-ndjson":
+        async for line in _stream_lines(request):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    elif content_type == "text/csv":
+        # one reader over the whole text so quoted fields may span lines
+        text = _decode_csv(await request.body())
+        header = None
+        for fields in csv.reader(io.StringIO(text, newline="")):
+            if len(fields) <= 1 and not "".join(fields).strip():
+                continue
+            if header is None:
+                header = [f.strip().lower() for f in fields]
+                if "name" not in header:
+                    raise HTTPException(status_code=400, detail="CSV roster needs a 'name' column")
+                continue
+            yield dict(zip(header, fields))
+    else:
+        raise HTTPException(status_code=415, detail="Roster must be text/csv, application/x-ndjson or application/json")
+
+async def _insert_roster_batch(batch: List[Tuple[int, User]]) -> List[Dict[str, Any]]:
+    docs = [u.model_dump() for _, u in batch]
+    failed: Dict[int, Dict[str, Any]] = {}
+    try:
+        await db.users.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+    dup_keys = [batch[i][1].external_id for i, err in failed.items() if err.get("code") == DUPLICATE_KEY]
+    existing: Dict[str, str] = {}
+    if dup_keys:
+        async for doc in db.users.find({"external_id": {"$in": dup_keys}}, {"_id": 0, "id": 1, "external_id": 1}):
+            existing[doc["external_id"]] = doc["id"]
+    results = []
+    for i, (row_no, user) in enumerate(batch):
+        res = {"row": row_no, "name": user.name, "external_id": user.external_id}
+        err = failed.get(i)
+        if err is None:
+            res.update(id=user.id, status="created")
+        elif err.get("code") == DUPLICATE_KEY and user.external_id in existing:
+            res.update(id=existing[user.external_id], status="exists")
+        else:
+            res.update(status="error", error=err.get("errmsg", "insert failed"))
+        results.append(res)
+    return results
+
+@api.post("/users/bulk")
+async def bulk_create_users(request: Request):
+    # The whole roster is read and inserted before the response starts: reading
+    # request.stream() from inside a StreamingResponse body races Starlette's
+    # disconnect listener, which swallows the remaining request chunks.
+    results: List[Dict[str, Any]] = []
+    batch: List[Tuple[int, User]] = []
+    row_no = 0
+    async for row in _roster_rows(request):
+        row_no += 1
+        name = str(row.get("name", "")).strip() if isinstance(row, dict) else ""
+        if not name:
+            results.append({"row": row_no, "status": "error", "error": "missing name"})
+            continue
+        external_id = str(row.get("external_id") or "").strip() or None
+        batch.append((row_no, User(name=name, external_id=external_id)))
+        if len(batch) >= ROSTER_BATCH_SIZE:
+            results.extend(await _insert_roster_batch(batch))
+            batch = []
+    if batch:
+        results.extend(await _insert_roster_batch(batch))
+    results.sort(key=lambda r: r["row"])
+    return StreamingResponse((json.dumps(r) + "\n" for r in results), media_type="application/x-ndjson")
+
 @api.get("/users/{user_id}/progress")
 async def get_user_progress(user_id: str):
-    raw = await db.progress.find({"user_id": user_id}).to_list(1000)
-    items = []
-    for it in raw:
-        it = dict(it)
-        if "_id" in it:
-            del it["_id"]
-        items.append(it)
-    # aggregate
-    total_points = sum(it.get("points_earned", 0) for it in items)
-    passed_levels = list({it.get("level_id") for it in items if it.get("passed")})
-    return {"items": items, "total_points": total_points, "passed_levels": passed_levels}
+    cached = progress_cache.get(user_id)
+    if cached is not None:
+        return cached
+    version = progress_cache.begin_fill(user_id)
+    try:
+        raw = await db.progress.find({"user_id": user_id}).to_list(PROGRESS_ITEMS_LIMIT)
+        items = []
+        for it in raw:
+            it = dict(it)
+            if "_id" in it:
+                del it["_id"]
+            items.append(it)
+        # aggregate
+        total_points = sum(it.get("points_earned", 0) for it in items)
+        passed_levels = list({it.get("level_id") for it in items if it.get("passed")})
+        payload = {"items": items, "total_points": total_points, "passed_levels": passed_levels}
+        progress_cache.put(user_id, payload, version)
+    finally:
+        progress_cache.end_fill(user_id)
+    return payload
 
 # -------- Admin endpoints (read-only summaries) --------
 @api.get("/admin/users")
@@ -361,33 +702,25 @@ async def admin_summary():
         'badges': badges,
     }
 
-@api.post("/execute_code", response_model=CodeRunResponse)
-async def execute_code(req: CodeRunRequest):
-    # choose sandbox microservice via env, else fallback
-    sandbox_url = os.environ.get('SANDBOX_URL')
+@api.get("/admin/db_stats")
+async def admin_db_stats():
+    return command_metrics.snapshot()
 
-    stdout = ""
-    stderr = ""
-
-    if not sandbox_url:
-        stdout, stderr = await run_in_sandbox_fallback(req.code)
-    else:
-        # Call external sandbox service via HTTP
-        try:
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                async with session.post(sandbox_url + '/run', json={"code": req.code}) as resp:
-                    data = await resp.json()
-                    stdout = data.get('stdout', '')
-                    stderr = data.get('stderr', '')
-        except Exception as e:
-            stderr = f"Sandbox error: {e}"
-
-    # validate
+@api.post("/execute_code", response_model=CodeRunResponse)
+async def execute_code(req: CodeRunRequest, request: Request):
     level = next((l for l in LEVELS if l.id == req.level_id), None)
     if not level:
         raise HTTPException(status_code=404, detail="Level not found")
 
+    # nothing is persisted if the client goes away or the deadline passes first
+    budget = request_budget(request)
+    try:
+        stdout, stderr = await cancel_on_disconnect(request, run_code(req.code, budget), budget)
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Deadline exceeded")
+
     result = validate_output(level, stdout, stderr)
     passed = result["passed"]
 
@@ -402,12 +735,30 @@ async def execute_code(req: CodeRunRequest):
     # persist progress
     prog = Progress(user_id=req.user_id, level_id=req.level_id, passed=passed, points_earned=pts, code=req.code)
     await db.progress.insert_one(prog.model_dump())
+    progress_cache.record(req.user_id, prog.model_dump())
 
     return CodeRunResponse(output=stdout, error=stderr or None, passed=passed, points_earned=pts)
 
 # Mount router
 app.include_router(api)
 
+@app.on_event("startup")
+async def attach_command_metrics():
+    command_metrics.attach(db, asyncio.get_running_loop())
+
+@app.on_event("startup")
+async def ensure_indexes():
+    await db.users.create_index(
+        "external_id", unique=True, partialFilterExpression={"external_id": {"$type": "string"}}
+    )
+
+@app.on_event("startup")
+async def start_change_listener():
+    app.state.change_listener = asyncio.create_task(watch_changes())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    listener = getattr(app.state, "change_listener", None)
+    if listener:
+        listener.cancel()
     client.close()
\ No newline at end of file
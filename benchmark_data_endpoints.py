@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the CodeQuest Kids data endpoints
+Fills users/progress with synthetic_data at growing sizes and reports
+latency and peak Python memory of get_user_progress, admin_summary and
+admin_users, against a local MongoDB or an in-memory stand-in
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "codequest_bench")
+
+from synthetic_data import SyntheticData
+
+
+# ---------- In-memory stand-in ----------
+# Just enough of the Motor collection API for the read endpoints. Filters are
+# equality-only and every find is a full scan, like an unindexed collection.
+class MemoryCursor:
+    def __init__(self, docs, flt):
+        self._docs = docs
+        self._flt = flt or {}
+
+    def _iter(self):
+        for doc in self._docs:
+            if all(doc.get(k) == v for k, v in self._flt.items()):
+                yield dict(doc)
+
+    async def to_list(self, length=None):
+        out = []
+        for doc in self._iter():
+            if length is not None and len(out) >= length:
+                break
+            out.append(doc)
+        return out
+
+    async def __aiter__(self):
+        for doc in self._iter():
+            yield doc
+
+
+class MemoryCollection:
+    def __init__(self):
+        self.docs = []
+
+    def find(self, flt=None, projection=None):
+        return MemoryCursor(self.docs, flt)
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(d) for d in docs)
+
+
+class MemoryDB:
+    def __init__(self):
+        self.users = MemoryCollection()
+        self.progress = MemoryCollection()
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+# ---------- Benchmark ----------
+def load(server, data, use_mongo, db_name):
+    """Fill the database and point server.db at it; returns a sample of user ids"""
+    if use_mongo:
+        from pymongo import MongoClient
+        sync_db = MongoClient(os.environ["MONGO_URL"])[db_name]
+        data.load_mongo(sync_db)
+        server.db = server.client[db_name]
+        return [u["id"] for u in sync_db.users.find({}, {"_id": 0, "id": 1}).limit(1000)]
+    mem = MemoryDB()
+    for name, doc in data.generate():
+        mem[name].docs.append(doc)
+    server.db = mem
+    return [u["id"] for u in mem.users.docs[:1000]]
+
+
+async def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - t) * 1000)
+    tracemalloc.start()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "peak_mb": peak / 2**20,
+    }
+
+
+async def bench_size(server, users, progress, args):
+    data = SyntheticData(users, progress, args.seed)
+    t = time.perf_counter()
+    user_ids = load(server, data, args.mongo, args.db)
+    print(f"\n📦 {users} users / {progress} progress records (loaded in {time.perf_counter() - t:.1f}s)")
+
+    rng = random.Random(args.seed)
+
+    async def progress_cold():
+        server.progress_cache.invalidate()
+        await server.get_user_progress(rng.choice(user_ids))
+
+    async def progress_warm():
+        await server.get_user_progress(user_ids[0])
+
+    cases = [
+        ("get_user_progress (cold)", progress_cold),
+        ("get_user_progress (cached)", progress_warm),
+        ("admin_summary", server.admin_summary),
+        ("admin_users", server.admin_users),
+    ]
+    rows = []
+    for label, fn in cases:
+        if fn is progress_warm:
+            await progress_warm()  # fill the cache so no timed call is a Mongo read
+        res = await measure(fn, args.repeat)
+        rows.append((users, progress, label, res))
+        print(f"  {label:<28} p50 {res['p50_ms']:9.2f}ms  p95 {res['p95_ms']:9.2f}ms  peak {res['peak_mb']:8.2f}MB")
+    return rows
+
+
+async def run(args):
+    import server
+    sizes = [tuple(int(x) for x in s.split(":")) for s in args.sizes.split(",")]
+    print(f"🚀 Benchmarking against {'MongoDB ' + args.db if args.mongo else 'in-memory stand-in'}")
+    for users, progress in sizes:
+        await bench_size(server, users, progress, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data endpoints as the dataset grows")
+    parser.add_argument("--sizes", default="100:10000,1000:100000,10000:1000000",
+                        help="comma separated users:progress pairs")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo", action="store_true", help="use MONGO_URL instead of the in-memory stand-in")
+    parser.add_argument("--db", default="codequest_bench", help="database to (re)fill when --mongo is set")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,6 +17,8 @@ import Confetti from "react-confetti";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Run budget shared with the backend; it stops work once we stop waiting
+const RUN_DEADLINE_MS = 10000;
 
 function useUserId() {
   const [userId, setUserId] = useState(() => localStorage.getItem("cq_user"));
@@ -132,7 +134,11 @@ const Home = () => {
     setRunOut("");
     setStderr("");
     try {
-      const { data } = await axios.post(`${API}/execute_code`, { user_id: userId, level_id: active, code, hints_used: hintShown });
+      const { data } = await axios.post(
+        `${API}/execute_code`,
+        { user_id: userId, level_id: active, code, hints_used: hintShown },
+        { timeout: RUN_DEADLINE_MS, headers: { "X-Deadline-Ms": String(RUN_DEADLINE_MS) } }
+      );
       setRunOut(data.output || "");
       setPassed(data.passed);
       setPoints(data.points_earned);
@@ -1,9 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 import docker
+import requests
+import asyncio
 import tempfile
+import shutil
+import glob
+import time
 import os
 import uuid
+from typing import Optional
 
 app = FastAPI(title="Sandbox Service")
 
@@ -18,22 +24,82 @@ class RunRes(BaseModel):
 # We enforce no net, cpu/mem limits, and short timeout.
 BLOCKLIST = ["import os", "import sys", "import subprocess", "socket", "open(", "__import__", "eval(", "exec("]
 
-@app.post("/run", response_model=RunRes)
-async def run(req: RunReq):
-    for bad in BLOCKLIST:
-        if bad in req.code:
-            return RunRes(stdout="", stderr="Blocked code detected")
+RUN_TIMEOUT = 3  # how long the program itself may run
+# remaining caller budget in milliseconds, forwarded by the backend; bounds the
+# whole request (queueing, container start and run) when present
+DEADLINE_HEADER = "X-Deadline-Ms"
+DISCONNECT_POLL = 0.1
+MAX_CONCURRENT = int(os.environ.get("SANDBOX_CONCURRENCY", "4"))
+# anything older than this is an orphan left by a crash or a cancelled request
+ORPHAN_AGE = int(os.environ.get("SANDBOX_ORPHAN_AGE", "60"))
+REAP_INTERVAL = int(os.environ.get("SANDBOX_REAP_INTERVAL", "30"))
+LABEL = "codequest.sandbox"
+WORKDIR_PREFIX = "cq_"
 
-    client = docker.from_env()
+_docker = None
+_slots = asyncio.Semaphore(MAX_CONCURRENT)
+_active_workdirs: set = set()
+stats = {
+    "runs": 0,
+    "active": 0,
+    "timeouts": 0,
+    "cancelled": 0,
+    "cleanup_failures": 0,
+    "reaped_containers": 0,
+    "reaped_workdirs": 0,
+}
 
-    tmpdir = tempfile.mkdtemp(prefix="cq_")
-    code_path = os.path.join(tmpdir, "main.py")
-    with open(code_path, "w") as f:
-        f.write(req.code)
+def docker_client():
+    global _docker
+    if _docker is None:
+        _docker = docker.from_env()
+    return _docker
 
-    # Command runs with resource limits and no network
+def _remove_container(container) -> bool:
     try:
-        container = client.containers.run(
+        container.remove(force=True)  # kills it first if still running
+    except docker.errors.NotFound:
+        pass
+    except Exception:
+        stats["cleanup_failures"] += 1
+        return False
+    return True
+
+def _run_containers(client, run_id: str) -> list:
+    try:
+        return client.containers.list(all=True, filters={"label": f"{LABEL}.run={run_id}"})
+    except Exception:
+        stats["cleanup_failures"] += 1
+        return []
+
+async def _cleanup(client, run_id, create, tmpdir):
+    if create is not None:
+        # a cancelled request may still be creating its container: wait for the
+        # call, then remove what it made (found by label if the call failed)
+        container, = await asyncio.gather(create, return_exceptions=True)
+        if isinstance(container, BaseException):
+            containers = await asyncio.to_thread(_run_containers, client, run_id)
+        else:
+            containers = [container]
+        for c in containers:
+            await asyncio.to_thread(_remove_container, c)
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    _active_workdirs.discard(tmpdir)
+
+async def _execute(code: str, deadline: Optional[float]) -> RunRes:
+    client = docker_client()
+    tmpdir = tempfile.mkdtemp(prefix=WORKDIR_PREFIX)
+    _active_workdirs.add(tmpdir)
+    run_id = uuid.uuid4().hex
+    create = None
+    try:
+        code_path = os.path.join(tmpdir, "main.py")
+        with open(code_path, "w") as f:
+            f.write(code)
+
+        # Command runs with resource limits and no network
+        create = asyncio.ensure_future(asyncio.to_thread(
+            client.containers.run,
             image="python:3.11-alpine",
             command=["python", "/work/main.py"],
             volumes={tmpdir: {"bind": "/work", "mode": "ro"}},
@@ -42,10 +108,18 @@ async def run(req: RunReq):
             nano_cpus=500_000_000, # 0.5 CPU
             detach=True,
             working_dir="/work",
-        )
-        result = container.wait(timeout=3)
-        logs = container.logs(stdout=True, stderr=True)
-        container.remove(force=True)
+            labels={LABEL: "1", f"{LABEL}.run": run_id, f"{LABEL}.started": str(int(time.time()))},
+        ))
+        container = await asyncio.shield(create)
+        timeout = RUN_TIMEOUT
+        if deadline is not None:
+            timeout = min(timeout, deadline - asyncio.get_running_loop().time())
+        try:
+            result = await asyncio.to_thread(container.wait, timeout=max(0.1, timeout))
+        except requests.exceptions.RequestException:
+            stats["timeouts"] += 1
+            return RunRes(stdout="", stderr="Timed out")
+        logs = await asyncio.to_thread(container.logs, stdout=True, stderr=True)
         stdout = logs.decode(errors="ignore")
         stderr = "" if result.get("StatusCode") == 0 else stdout
         if stderr:
@@ -53,3 +127,93 @@ async def run(req: RunReq):
         return RunRes(stdout=stdout.strip(), stderr=stderr.strip())
     except Exception as e:
         return RunRes(stdout="", stderr=str(e))
+    finally:
+        # shielded so a cancelled request still kills its container
+        await asyncio.shield(_cleanup(client, run_id, create, tmpdir))
+
+def _budget(request: Request) -> Optional[float]:
+    try:
+        return int(request.headers[DEADLINE_HEADER]) / 1000
+    except (KeyError, ValueError):
+        return None
+
+@app.post("/run", response_model=RunRes)
+async def run(req: RunReq, request: Request):
+    for bad in BLOCKLIST:
+        if bad in req.code:
+            return RunRes(stdout="", stderr="Blocked code detected")
+
+    loop = asyncio.get_running_loop()
+    budget = _budget(request)
+    deadline = None if budget is None else loop.time() + budget
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=None if deadline is None else max(0.0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        return RunRes(stdout="", stderr="Timed out")
+    stats["runs"] += 1
+    stats["active"] += 1
+    # cancelling the task runs _execute's cleanup, which kills the container
+    task = asyncio.ensure_future(_execute(req.code, deadline))
+    try:
+        while True:
+            poll = DISCONNECT_POLL
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    stats["timeouts"] += 1
+                    return RunRes(stdout="", stderr="Timed out")
+                poll = min(poll, remaining)
+            done, _ = await asyncio.wait({task}, timeout=poll)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                stats["cancelled"] += 1
+                return RunRes(stdout="", stderr="Cancelled")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        stats["active"] -= 1
+        _slots.release()
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+# ---------- Reaper ----------
+# Containers that outlived a crashed service or a failed removal are found by
+# label and killed. Old workdirs go the same way.
+def _reap_once():
+    now = time.time()
+    try:
+        containers = docker_client().containers.list(all=True, filters={"label": LABEL})
+    except Exception:
+        containers = []
+    for c in containers:
+        started = int(c.labels.get(f"{LABEL}.started", "0") or 0)
+        if now - started > ORPHAN_AGE:
+            if _remove_container(c):
+                stats["reaped_containers"] += 1
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), WORKDIR_PREFIX + "*")):
+        if path in _active_workdirs:
+            continue
+        try:
+            if now - os.path.getmtime(path) > ORPHAN_AGE:
+                shutil.rmtree(path, ignore_errors=True)
+                stats["reaped_workdirs"] += 1
+        except OSError:
+            pass
+
+async def reaper():
+    while True:
+        await asyncio.to_thread(_reap_once)
+        await asyncio.sleep(REAP_INTERVAL)
+
+@app.on_event("startup")
+async def start_reaper():
+    app.state.reaper = asyncio.create_task(reaper())
+
+@app.on_event("shutdown")
+async def stop_reaper():
+    app.state.reaper.cancel()
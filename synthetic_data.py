@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic users/progress generator for CodeQuest Kids
+Produces realistic level progression (drop-off, attempts per level, pass
+rates, hint usage, code sizes) and can load it into a MongoDB database
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+# Mirrors LEVELS in backend/server.py: (id, points)
+LEVEL_POINTS = [("1", 10), ("2", 10), ("3", 10), ("4", 10), ("5", 10),
+                ("6", 10), ("7", 10), ("8", 10), ("9", 10), ("10", 30)]
+
+FIRST = ["Ava", "Leo", "Mia", "Noah", "Zoe", "Eli", "Ivy", "Max", "Ada", "Sam",
+         "Ruby", "Finn", "Luna", "Omar", "Nia", "Theo", "Maya", "Kai", "Iris", "Jude"]
+LAST = ["Lee", "Khan", "Diaz", "Park", "Smith", "Ng", "Brown", "Rossi", "Cohen", "Ito"]
+
+DROPOUT = 0.12          # chance a student stops before the next level
+HINT_WEIGHTS = [0.62, 0.24, 0.14]  # 0, 1 or 2 hints used per attempt
+EPOCH = datetime(2025, 9, 1)
+
+
+class SyntheticData:
+    def __init__(self, users=10_000, progress=1_000_000, seed=42):
+        self.users = users
+        self.progress = progress
+        self.seed = seed
+        # expected number of levels a student reaches given the drop-off
+        reach = sum((1 - DROPOUT) ** k for k in range(len(LEVEL_POINTS)))
+        self.mean_attempts = max(1.0, progress / max(1, users) / reach)
+
+    def _uid(self, rng):
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def _attempts(self, rng, level_index):
+        # later levels take more tries; geometric-ish tail around the mean
+        mean = self.mean_attempts * (0.7 + 0.06 * level_index)
+        if mean <= 1:
+            return 1
+        return 1 + int(rng.expovariate(1 / (mean - 1)))
+
+    def _code(self, rng):
+        # log-normal code sizes, median ~60 chars, long tail of pasted programs
+        size = min(4000, max(5, int(rng.lognormvariate(math.log(60), 0.8))))
+        return ("print('x')\n" * (size // 11 + 1))[:size]
+
+    def _attempt(self, rng, user_id, index, passed, t):
+        level_id, points = LEVEL_POINTS[index]
+        hints = rng.choices(range(3), HINT_WEIGHTS)[0]
+        return {
+            "id": self._uid(rng),
+            "user_id": user_id,
+            "level_id": level_id,
+            "passed": passed,
+            "points_earned": int(round(points * max(0.0, 1 - 0.2 * hints))) if passed else 0,
+            "code": self._code(rng),
+            "created_at": t,
+        }
+
+    def generate(self):
+        """Yield ("users"|"progress", doc) pairs; identical output for the same seed"""
+        rng = random.Random(self.seed)
+        remaining = self.progress
+        reached = []  # (user_id, highest level index, last activity) for replays
+        for n in range(self.users):
+            created = EPOCH + timedelta(seconds=rng.randrange(90 * 24 * 3600))
+            user = {
+                "id": self._uid(rng),
+                "name": f"{rng.choice(FIRST)} {rng.choice(LAST)} {n}",
+                "external_id": None,
+                "created_at": created,
+            }
+            yield "users", user
+            # cap any one student at twice the fair share of what is left
+            budget = min(remaining, math.ceil(remaining / (self.users - n)) * 2)
+            t = created
+            top = 0
+            for index in range(len(LEVEL_POINTS)):
+                if budget <= 0 or (index and rng.random() < DROPOUT):
+                    break
+                top = index
+                tries = min(self._attempts(rng, index), budget)
+                passed = False
+                for attempt in range(tries):
+                    passed = attempt == tries - 1 and rng.random() < 0.93
+                    t += timedelta(seconds=rng.randrange(20, 600))
+                    yield "progress", self._attempt(rng, user["id"], index, passed, t)
+                    remaining -= 1
+                    budget -= 1
+                if not passed:
+                    break
+            reached.append((user["id"], top, t))
+        # top up to the exact record count with students replaying levels they reached
+        while remaining > 0 and reached:
+            user_id, top, t = reached[rng.randrange(len(reached))]
+            t += timedelta(seconds=rng.randrange(3600, 7 * 24 * 3600))
+            yield "progress", self._attempt(rng, user_id, rng.randint(0, top), rng.random() < 0.8, t)
+            remaining -= 1
+
+    def load_mongo(self, db, batch_size=5000):
+        """Replace users/progress in a pymongo database with generated data"""
+        db.users.drop()
+        db.progress.drop()
+        batches = {"users": [], "progress": []}
+        counts = {"users": 0, "progress": 0}
+        for name, doc in self.generate():
+            batches[name].append(doc)
+            counts[name] += 1
+            if len(batches[name]) >= batch_size:
+                db[name].insert_many(batches[name], ordered=False)
+                batches[name] = []
+        for name, docs in batches.items():
+            if docs:
+                db[name].insert_many(docs, ordered=False)
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill users/progress with synthetic data")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--progress", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    # never default to the app's DB_NAME: loading drops users and progress first
+    parser.add_argument("--db", default="codequest_bench", help="database to (re)fill; its users/progress are dropped")
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    db = MongoClient(args.mongo_url)[args.db]
+    counts = SyntheticData(args.users, args.progress, args.seed).load_mongo(db)
+    print(f"✅ Loaded {counts['users']} users and {counts['progress']} progress records into {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+from pymongo.errors import BulkWriteError
+
+import server
+
+
+class FakeUsers:
+    """Just enough of a Motor collection for the roster endpoint, with the
+    unique external_id index enforced like Mongo does"""
+
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        seen = {d["external_id"] for d in self.docs if d.get("external_id")}
+        errors = []
+        for i, doc in enumerate(docs):
+            key = doc.get("external_id")
+            if key and key in seen:
+                errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+                continue
+            seen.add(key)
+            self.docs.append(dict(doc))
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def _iter(self, flt):
+        wanted = set(flt["external_id"]["$in"])
+        for doc in self.docs:
+            if doc.get("external_id") in wanted:
+                yield {"id": doc["id"], "external_id": doc["external_id"]}
+
+    def find(self, flt, projection=None):
+        return self._iter(flt)
+
+
+class FakeDB:
+    def __init__(self):
+        self.users = FakeUsers()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "db", FakeDB())
+    return TestClient(server.app)
+
+
+def chunked(body: bytes, size: int):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+async def asgi_post(path, chunks, content_type):
+    # like uvicorn: body chunks arrive one receive() at a time, then receive()
+    # blocks until the client disconnects after the response is sent
+    pending = list(chunks)
+    done = asyncio.Event()
+    sent = {"status": None, "body": b""}
+
+    async def receive():
+        await asyncio.sleep(0)
+        if pending:
+            chunk = pending.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(pending)}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            sent["body"] += message.get("body", b"")
+            if not message.get("more_body"):
+                done.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "server": ("test", 80), "client": ("test", 1234),
+        "headers": [(b"content-type", content_type.encode()), (b"transfer-encoding", b"chunked")],
+    }
+    await server.app(scope, receive, send)
+    return sent["status"], sent["body"].decode()
+
+
+def test_chunked_csv_roster_is_fully_provisioned(client):
+    rows = ["name,external_id"] + [f"Student {i},S{i}" for i in range(3000)]
+    body = ("\n".join(rows) + "\n").encode()
+    status, text = asyncio.run(asgi_post("/api/users/bulk", chunked(body, 8192), "text/csv"))
+    assert status == 200
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert len(lines) == 3000
+    assert [r["row"] for r in lines] == list(range(1, 3001))
+    assert all(r["status"] == "created" for r in lines)
+    assert len(server.db.users.docs) == 3000
+
+
+def test_every_result_line_carries_its_row(client):
+    client.post("/api/users/bulk", content=b"name,external_id\nAva,A1\n", headers={"content-type": "text/csv"})
+    body = b"name,external_id\nLeo,L1\n,X9\nAva again,A1\n"
+    resp = client.post("/api/users/bulk", content=chunked(body, 5), headers={"content-type": "text/csv"})
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [(r["row"], r["status"]) for r in lines] == [(1, "created"), (2, "error"), (3, "exists")]
+    ava = next(d for d in server.db.users.docs if d["external_id"] == "A1")
+    assert lines[2]["id"] == ava["id"]
+
+
+def test_csv_quoted_field_spans_lines(client):
+    body = b'name,external_id\r\n"Ann\nB",A1\r\n\r\nCy,C1\r\n'
+    resp = client.post("/api/users/bulk", content=chunked(body, 4), headers={"content-type": "text/csv"})
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [(r["row"], r["name"]) for r in lines] == [(1, "Ann\nB"), (2, "Cy")]
+
+
+def test_non_utf8_csv_is_read_as_cp1252(client):
+    body = "name\nZo\u00eb\nRen\u00e9e\n".encode("cp1252")
+    resp = client.post("/api/users/bulk", content=body, headers={"content-type": "text/csv"})
+    assert resp.status_code == 200
+    assert [json.loads(line)["name"] for line in resp.text.splitlines()] == ["Zo\u00eb", "Ren\u00e9e"]
+
+
+def test_non_utf8_ndjson_is_rejected(client):
+    body = '{"name": "Zo\u00eb"}\n'.encode("latin-1")
+    resp = client.post("/api/users/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    assert resp.status_code == 400
+
+
+def test_ndjson_roster(client):
+    body = b'{"name": "Mia"}\n{"name": "Kai", "external_id": 7}\n'
+    resp = client.post("/api/users/bulk", content=chunked(body, 3), headers={"content-type": "application/x-ndjson"})
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [(r["row"], r["external_id"]) for r in lines] == [(1, None), (2, "7")]
+
+
+def test_unsupported_content_type(client):
+    resp = client.post("/api/users/bulk", content=b"x", headers={"content-type": "text/plain"})
+    assert resp.status_code == 415
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from db_metrics import CommandMetrics  # noqa: E402
+
+SERVER = ("localhost", 27017)
+
+
+class Driver:
+    """Feeds started/succeeded pairs to the listener the way pymongo does"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.request_id = 0
+
+    def command(self, name, cmd, reply, ms):
+        self.request_id += 1
+        self.metrics.started(SimpleNamespace(
+            command_name=name, command=cmd, connection_id=SERVER, request_id=self.request_id))
+        self.metrics.succeeded(SimpleNamespace(
+            command_name=name, reply=reply, connection_id=SERVER, request_id=self.request_id,
+            duration_micros=int(ms * 1000)))
+
+
+def test_slow_getmore_carries_the_find_filter():
+    metrics = CommandMetrics(slow_ms=100)
+    driver = Driver(metrics)
+    driver.command("find", {"find": "progress", "filter": {"user_id": "u1"}},
+                   {"cursor": {"id": 42, "firstBatch": [{}] * 101}}, 5)
+    driver.command("getMore", {"getMore": 42, "collection": "progress"},
+                   {"cursor": {"id": 0, "nextBatch": [{}] * 500}}, 300)
+    [entry] = metrics.snapshot()["slow_ops"]
+    assert entry["op"] == "progress.getMore"
+    assert entry["filter"] == {"user_id": "str"}
+    assert entry["docs"] == 500
+    assert metrics._cursors == {}  # exhausted cursors are forgotten
+
+
+def test_change_stream_getmores_are_ignored():
+    metrics = CommandMetrics(slow_ms=100)
+    driver = Driver(metrics)
+    driver.command("aggregate", {"aggregate": 1, "pipeline": [{"$changeStream": {}}]},
+                   {"cursor": {"id": 7, "firstBatch": []}}, 2)
+    for _ in range(3):
+        driver.command("getMore", {"getMore": 7, "collection": "$cmd.aggregate"},
+                       {"cursor": {"id": 7, "nextBatch": []}}, 1000)
+    snapshot = metrics.snapshot()
+    assert snapshot["slow_ops"] == []
+    assert snapshot["commands"] == {}
+
+
+def test_kill_cursors_forgets_the_origin():
+    metrics = CommandMetrics(slow_ms=100)
+    driver = Driver(metrics)
+    driver.command("find", {"find": "users", "filter": {}}, {"cursor": {"id": 9, "firstBatch": []}}, 1)
+    driver.command("killCursors", {"killCursors": "users", "cursors": [9]}, {"ok": 1}, 1)
+    assert metrics._cursors == {}
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+import server
+
+SPIN = "while True:\n    x = [i for i in range(1)]"  # outside the interpreter subset
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_fallback_runs_outside_the_subset():
+    assert run(server.run_in_sandbox_fallback("print([i * 2 for i in range(3)])")) == ("[0, 2, 4]", "")
+    out, err = run(server.run_in_sandbox_fallback("print(1)\nprint(1 / 0)"))
+    assert out == "1" and "ZeroDivisionError" in err and "line 2" in err
+
+
+def test_fallback_blocked_code():
+    assert run(server.run_in_sandbox_fallback("import os")) == ("", "Blocked code detected")
+
+
+def test_fallback_timeout_kills_process():
+    t = time.monotonic()
+    assert run(server.run_in_sandbox_fallback(SPIN)) == ("", "Timed out")
+    assert time.monotonic() - t < server.FALLBACK_TIMEOUT + 2
+
+
+def test_cancelled_fallback_does_not_block_the_loop():
+    async def main():
+        task = asyncio.ensure_future(server.run_in_sandbox_fallback(SPIN))
+        await asyncio.sleep(0.3)
+        t = time.monotonic()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.monotonic() - t
+
+    assert run(main()) < 1
+
+
+def test_execute_code_deadline_returns_504(monkeypatch):
+    class NoWrites:
+        async def insert_one(self, doc):
+            raise AssertionError("progress must not be written after a missed deadline")
+
+    class FakeDB:
+        progress = NoWrites()
+
+    monkeypatch.setattr(server, "db", FakeDB())
+    monkeypatch.delenv("SANDBOX_URL", raising=False)
+    client = TestClient(server.app)
+    t = time.monotonic()
+    resp = client.post(
+        "/api/execute_code",
+        json={"user_id": "u1", "level_id": "1", "code": SPIN},
+        headers={"X-Deadline-Ms": "1000"},
+    )
+    assert resp.status_code == 504
+    assert time.monotonic() - t < 2
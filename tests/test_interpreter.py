@@ -0,0 +1,149 @@
+import ast
+import asyncio
+import contextlib
+import html
+import io
+import os
+
+import pytest
+
+import interpreter
+from interpreter import Unsupported, run_restricted
+
+SERVER_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend", "server.py")
+
+
+def _level_examples():
+    # read LEVELS straight from server.py so the test doesn't need the web stack
+    tree = ast.parse(open(SERVER_PY).read())
+    examples = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and getattr(node.func, "id", None) == "Level":
+            fields = {k.arg: k.value for k in node.keywords}
+            examples.append(html.unescape(ast.literal_eval(fields["example_code"])))
+    return examples
+
+
+def run(code, **kwargs):
+    return asyncio.run(run_restricted(code, **kwargs))
+
+
+def cpython(code):
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        exec(code, {})
+    out = buf.getvalue()
+    return out[:-1] if out.endswith("\n") else out
+
+
+SOLUTIONS = [
+    "pet = 'cat'\nprint(pet)",
+    "print(7 + 8)",
+    "print('hello world'.upper())",
+    "number = 5\nif number > 3:\n    print('yay')",
+    "for i in range(3):\n    print(i)",
+    "n = 1\nwhile n <= 3:\n    print(n)\n    n += 1",
+    "def add2(x):\n    return x + 2\nprint(add2(5))",
+    "nums = [3, 4, 5]\nprint(len(nums))",
+    "d = {'color': 'blue'}\nprint(d['color'])",
+    "def greet(name):\n    return 'Hello ' + name\nprint(greet('KidCoder'))",
+    "a, b = 1, 2\nprint(a, b, sep='-', end='!\\n')\nprint(f'{a:>3}|{b!r}')",
+    "def outer():\n    k = 3\n    def inner(v=1):\n        return k + v\n    return inner(2)\nprint(outer())",
+    "l = [1, 2]\nl.append(3)\nl[0] += 10\nprint(l, l[1:], ','.join(['a', 'b']))",
+    "for i in range(5):\n    if i == 1:\n        continue\n    if i == 3:\n        break\n    print(i)\nelse:\n    print('no')",
+    "print(sorted({'b': 1, 'a': 2}.items()), sum([1, 2, 3]), max(3, 7), 7 // 2, 7 % 3)",
+    "a = [1]\nb = a\na += [2]\na *= 2\nprint(b)",
+    "def add(lst):\n    lst += [9]\nnums = [1]\nadd(nums)\nprint(nums)",
+    "def f():\n    print('f')\n    return 0\na = [1, 2]\na[f()] += 1\nprint(a)",
+    "t = (1,)\nu = t\nt += (2,)\ns = 'a'\ns += 'b'\nprint(t, u, s)",
+]
+
+
+@pytest.mark.parametrize("code", _level_examples() + SOLUTIONS)
+def test_matches_cpython(code):
+    assert run(code) == (cpython(code), "")
+
+
+def test_level_examples_found():
+    assert len(_level_examples()) == 10
+
+
+def test_step_budget():
+    out, err = run("while True:\n    pass", max_steps=5000)
+    assert "StepLimitExceeded" in err and "line 2" in err
+
+
+def test_allocation_budget():
+    _, err = run("x = 'a' * 10**9")
+    assert "AllocationLimitExceeded" in err
+    _, err = run("x = list(range(10**9))", max_steps=10**9, max_alloc=1000)
+    assert "AllocationLimitExceeded" in err
+
+
+def test_int_size_budget():
+    _, err = run("print(2 ** 10**9)")
+    assert "number too large" in err
+    _, err = run("x = 2\nfor i in range(30):\n    x = x * x")
+    assert "number too large" in err and "line 3" in err
+
+
+def test_yields_to_event_loop():
+    ticks = []
+
+    async def main():
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+        t = asyncio.ensure_future(ticker())
+        await run_restricted("n = 0\nwhile n < 20000:\n    n += 1")
+        t.cancel()
+
+    asyncio.run(main())
+    assert len(ticks) > 10
+
+
+@pytest.mark.parametrize("code", [
+    "import os",
+    "print((lambda: 1)())",
+    "'x'.__class__",
+    "print(type(15))",
+    "print(isinstance(1, int))",
+    "name = input()",
+    "x = 5\nprint('%d' % x)",
+    "print([i for i in range(3)])",
+    "def f(n):\n    return 0 if n == 0 else 1 + f(n - 1)\nprint(f(60))",
+    "s = set([1, 2])\ns.remove(1)\nprint(s)",
+    "print((1, 2, 2).count(2))",
+])
+def test_outside_subset_falls_back(code):
+    with pytest.raises(Unsupported):
+        run(code)
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("print(1 / 0)", "ZeroDivisionError"),
+    ("print(x)\nx = 1", "NameError"),
+    ("def f():\n    x = x + 1\nf()", "UnboundLocalError"),
+    ("[1][5]", "IndexError"),
+    ("{}['k']", "KeyError"),
+    ("def f(:", "SyntaxError"),
+    ("return 1", "SyntaxError"),
+    ("print(" + "+".join(["1"] * 1200) + ")", "RecursionError"),
+    ("print('a\x00')", "SyntaxError"),
+])
+def test_errors_are_reported(code, expected):
+    out, err = run(code)
+    assert expected in err
+    assert "line " in err
+
+
+def test_output_before_error_is_kept():
+    out, err = run("print('hi')\nprint(1 / 0)")
+    assert out == "hi"
+    assert "line 2" in err
+
+
+def test_recursion_within_limit():
+    code = "def f(n):\n    if n == 0:\n        return 0\n    return 1 + f(n - 1)\nprint(f(%d))" % (interpreter.MAX_CALL_DEPTH - 1)
+    assert run(code) == (str(interpreter.MAX_CALL_DEPTH - 1), "")
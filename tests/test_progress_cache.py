@@ -0,0 +1,211 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+from pymongo.errors import OperationFailure  # noqa: E402
+
+import server  # noqa: E402
+from server import ProgressCache  # noqa: E402
+
+
+def item(n, user="u1", points=10, passed=True, level="1"):
+    return {"id": f"p{n}", "user_id": user, "level_id": level, "passed": passed, "points_earned": points}
+
+
+def payload(*items):
+    return {
+        "items": list(items),
+        "total_points": sum(it["points_earned"] for it in items),
+        "passed_levels": sorted({it["level_id"] for it in items if it["passed"]}),
+    }
+
+
+def fill(cache, user_id, data):
+    version = cache.begin_fill(user_id)
+    cache.put(user_id, data, version)
+    cache.end_fill(user_id)
+
+
+# ---------- ProgressCache ----------
+def test_lru_eviction():
+    cache = ProgressCache(2)
+    fill(cache, "a", payload(item(1, user="a")))
+    fill(cache, "b", payload(item(2, user="b")))
+    assert cache.get("a") is not None  # a is now the most recent
+    fill(cache, "c", payload(item(3, user="c")))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_get_returns_a_copy():
+    cache = ProgressCache(2)
+    fill(cache, "u1", payload(item(1)))
+    cache.get("u1")["items"].append(item(2))
+    assert len(cache.get("u1")["items"]) == 1
+
+
+def test_record_updates_in_place():
+    cache = ProgressCache(2)
+    fill(cache, "u1", payload(item(1, level="1")))
+    cache.record("u1", item(2, level="2", points=30))
+    cache.record("u1", item(3, level="3", points=0, passed=False))
+    cached = cache.get("u1")
+    assert [it["id"] for it in cached["items"]] == ["p1", "p2", "p3"]
+    assert cached["total_points"] == 40
+    assert sorted(cached["passed_levels"]) == ["1", "2"]
+
+
+def test_change_stream_echo_is_applied_once():
+    cache = ProgressCache(2)
+    fill(cache, "u1", payload())
+    cache.record("u1", item(1))
+    cache.record("u1", item(1))  # the same insert coming back from the change stream
+    assert cache.get("u1")["total_points"] == 10
+    assert len(cache.get("u1")["items"]) == 1
+
+
+def test_item_cap_invalidates(monkeypatch):
+    monkeypatch.setattr(server, "PROGRESS_ITEMS_LIMIT", 3)
+    cache = ProgressCache(2)
+    fill(cache, "u1", payload(item(1), item(2), item(3)))
+    cache.record("u1", item(4))
+    assert cache.get("u1") is None
+
+
+def test_write_during_fill_is_fenced():
+    cache = ProgressCache(4)
+    stale = cache.begin_fill("u1")
+    other = cache.begin_fill("u2")
+    cache.record("u1", item(1))
+    cache.put("u1", payload(), stale)
+    cache.put("u2", payload(), other)  # a write for u1 doesn't fence u2
+    cache.end_fill("u1")
+    cache.end_fill("u2")
+    assert cache.get("u1") is None
+    assert cache.get("u2") is not None
+
+
+def test_full_invalidation_fences_every_fill():
+    cache = ProgressCache(4)
+    version = cache.begin_fill("u1")
+    cache.invalidate()
+    cache.put("u1", payload(), version)
+    cache.end_fill("u1")
+    assert cache.get("u1") is None
+
+
+def test_write_counters_only_live_during_fills():
+    cache = ProgressCache(4)
+    for n in range(100):
+        cache.record(f"u{n}", item(n, user=f"u{n}"))
+    cache.begin_fill("u1")
+    second = cache.begin_fill("u1")
+    cache.end_fill("u1")
+    cache.record("u1", item(1))
+    cache.put("u1", payload(), second)  # the other fill is still tracked, so this is fenced
+    assert cache.get("u1") is None
+    cache.end_fill("u1")
+    assert cache._fills == {}
+
+
+def test_get_user_progress_reads_through(cache, monkeypatch):
+    calls = []
+
+    class Cursor:
+        def __init__(self, docs):
+            self.docs = docs
+
+        async def to_list(self, limit):
+            return [dict(d, _id=object()) for d in self.docs[:limit]]
+
+    class Progress:
+        def find(self, flt):
+            calls.append(flt)
+            return Cursor([item(1), item(2, level="2", passed=False, points=0)])
+
+    class DB:
+        progress = Progress()
+
+    monkeypatch.setattr(server, "db", DB())
+    first = asyncio.run(server.get_user_progress("u1"))
+    second = asyncio.run(server.get_user_progress("u1"))
+    assert first == second
+    assert first["total_points"] == 10 and first["passed_levels"] == ["1"]
+    assert calls == [{"user_id": "u1"}]
+    assert cache._fills == {}
+
+
+# ---------- change-stream listener ----------
+class FakeStream:
+    def __init__(self, changes, error):
+        self.changes = changes
+        self.error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        if self.error is not None:
+            raise self.error
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for n, change in enumerate(self.changes):
+            self.resume_token = {"_data": n}
+            yield change
+        await asyncio.Event().wait()  # idle stream
+
+
+class FakeDB:
+    def __init__(self, changes=(), error=None):
+        self.changes = list(changes)
+        self.error = error
+
+    def watch(self, pipeline, resume_after=None):
+        return FakeStream(self.changes, self.error)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ProgressCache(4)
+    monkeypatch.setattr(server, "progress_cache", cache)
+    return cache
+
+
+def listen(monkeypatch, db, seconds=0.1):
+    monkeypatch.setattr(server, "db", db)
+
+    async def main():
+        task = asyncio.ensure_future(server.watch_changes())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_standalone_server_disables_the_cache(cache, monkeypatch):
+    fill(cache, "u1", payload(item(1)))
+    listen(monkeypatch, FakeDB(error=OperationFailure("not a replica set", code=server.CHANGE_STREAM_UNSUPPORTED)))
+    assert cache.get("u1") is None
+    fill(cache, "u1", payload(item(1)))
+    assert cache.get("u1") is None
+
+
+def test_failing_handler_invalidates_and_keeps_listening(cache, monkeypatch):
+    fill(cache, "u1", payload(item(1)))
+    fill(cache, "u2", payload(item(2, user="u2")))
+    seen = []
+    monkeypatch.setitem(server.CHANGE_HANDLERS, "progress", [server._progress_changed, seen.append])
+    bad = {"ns": {"coll": "progress"}, "operationType": "insert", "fullDocument": item(3, points=None)}
+    good = {"ns": {"coll": "progress"}, "operationType": "insert", "fullDocument": item(4, user="u3")}
+    listen(monkeypatch, FakeDB([bad, good]))
+    assert cache.get("u1") is None and cache.get("u2") is None
+    assert seen == [bad, good]  # the listener kept going
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+docker = pytest.importorskip("docker")
+requests = pytest.importorskip("requests")
+
+import service  # noqa: E402
+
+
+class FakeContainer:
+    def __init__(self, client, labels, run_time):
+        self.client = client
+        self.labels = labels
+        self.run_time = run_time
+        self.wait_timeout = None
+        self.removed = False
+
+    def wait(self, timeout):
+        self.wait_timeout = timeout
+        if self.run_time > timeout:
+            time.sleep(timeout)
+            raise requests.exceptions.ReadTimeout("timed out")
+        time.sleep(self.run_time)
+        return {"StatusCode": 0}
+
+    def logs(self, stdout, stderr):
+        return b"done\n"
+
+    def remove(self, force):
+        assert force
+        if self.client.remove_fails:
+            raise docker.errors.APIError("daemon busy")
+        self.removed = True
+        self.client.containers.created.remove(self)
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+        self.created = []
+
+    def run(self, **kwargs):
+        self.client.workdirs.extend(kwargs["volumes"])
+        container = FakeContainer(self.client, kwargs["labels"], self.client.run_time)
+        self.created.append(container)
+        time.sleep(self.client.start_time)
+        if self.client.start_fails:
+            raise docker.errors.APIError("could not start")
+        return container
+
+    def list(self, all, filters):
+        key, _, value = filters["label"].partition("=")
+        return [c for c in self.created if key in c.labels and (not value or c.labels[key] == value)]
+
+
+class FakeClient:
+    def __init__(self, run_time=0.0, start_time=0.0):
+        self.run_time = run_time
+        self.start_time = start_time
+        self.remove_fails = False
+        self.start_fails = False
+        self.workdirs = []
+        self.containers = FakeContainers(self)
+
+
+class FakeRequest:
+    def __init__(self, deadline_ms=None):
+        self.headers = {} if deadline_ms is None else {service.DEADLINE_HEADER: str(deadline_ms)}
+
+    async def is_disconnected(self):
+        return False
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(service, "_docker", fake)
+    monkeypatch.setattr(service, "stats", dict.fromkeys(service.stats, 0))
+    return fake
+
+
+def run(code="print('hi')", deadline_ms=None):
+    return service.run(service.RunReq(code=code), FakeRequest(deadline_ms))
+
+
+def test_run_timeout_starts_after_container_creation(client, monkeypatch):
+    monkeypatch.setattr(service, "RUN_TIMEOUT", 0.5)
+    client.start_time = 0.3
+    client.run_time = 0.4
+    assert asyncio.run(run()) == service.RunRes(stdout="done", stderr="")
+    assert client.containers.created == []
+
+
+def test_queued_requests_get_the_full_run_timeout(client, monkeypatch):
+    monkeypatch.setattr(service, "RUN_TIMEOUT", 0.5)
+    client.run_time = 0.4
+
+    async def main():
+        monkeypatch.setattr(service, "_slots", asyncio.Semaphore(1))
+        return await asyncio.gather(run(), run())
+
+    assert [r.stdout for r in asyncio.run(main())] == ["done", "done"]
+    assert service.stats["timeouts"] == 0
+
+
+def test_forwarded_deadline_bounds_the_run(client):
+    client.start_time = 0.2
+    client.run_time = 5
+    t = time.monotonic()
+    assert asyncio.run(run(deadline_ms=600)).stderr == "Timed out"
+    assert time.monotonic() - t < 1.5
+    assert client.containers.created == []
+
+
+def test_wait_timeout_removes_container_and_workdir(client, monkeypatch):
+    monkeypatch.setattr(service, "RUN_TIMEOUT", 0.2)
+    client.run_time = 5
+    assert asyncio.run(run()).stderr == "Timed out"
+    assert client.containers.created == []
+    assert not any(os.path.exists(d) for d in client.workdirs)
+    assert service.stats["timeouts"] == 1
+
+
+def test_failed_start_removes_container_by_label(client):
+    client.start_fails = True
+    assert "could not start" in asyncio.run(run()).stderr
+    assert client.containers.created == []
+
+
+@pytest.mark.parametrize("start_time, run_time", [(0.3, 0), (0, 5)])
+def test_cancellation_still_cleans_up(client, start_time, run_time):
+    # cancelled while containers.run is in flight, then while waiting on the program
+    client.start_time = start_time
+    client.run_time = run_time
+
+    async def main():
+        task = asyncio.ensure_future(service._execute("print('hi')", None))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert client.workdirs and client.containers.created == []
+    assert not any(os.path.exists(d) for d in client.workdirs)
+
+
+def test_reaper_counts_only_removed_containers(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    old = str(int(time.time()) - service.ORPHAN_AGE - 1)
+    orphan = FakeContainer(client, {service.LABEL: "1", f"{service.LABEL}.started": old}, 0)
+    young = FakeContainer(client, {service.LABEL: "1", f"{service.LABEL}.started": str(int(time.time()))}, 0)
+    client.containers.created += [orphan, young]
+    stale, active = tmp_path / "cq_stale", tmp_path / "cq_active"
+    for d in (stale, active):
+        d.mkdir()
+        os.utime(d, (0, 0))
+    monkeypatch.setattr(service, "_active_workdirs", {str(active)})
+
+    client.remove_fails = True
+    service._reap_once()
+    assert service.stats["reaped_containers"] == 0
+    assert service.stats["cleanup_failures"] == 1
+
+    client.remove_fails = False
+    service._reap_once()
+    assert client.containers.created == [young]
+    assert service.stats["reaped_containers"] == 1
+    assert not stale.exists() and active.exists()
+    assert service.stats["reaped_workdirs"] == 1